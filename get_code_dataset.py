@@ -1,6 +1,9 @@
 import os
+import queue
 import shutil
 import signal
+import sys
+import threading
 
 os.environ['HF_HOME'] = "D:\.cache"
 
@@ -9,15 +12,29 @@ from tqdm import tqdm
 from datasets import load_dataset, IterableDataset
 
 
+PREFETCH_SIZE = 64
+NUM_WRITERS = 8
+PROGRESS_INTERVAL = 1000
+
+
+def _write_raw(path, data):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
 def save_python_code(python):
-    os.makedirs("data/python_code/documents", exist_ok=True)
-    with open(f"data/python_code/documents/{python['hexsha']}.txt", "w") as f:
-        f.write(python["content"])
+    _write_raw(f"data/python_code/documents/{python['hexsha']}.txt", python["content"].encode("utf-8"))
 
 def save_progress(index):
     os.makedirs("data/python_code", exist_ok=True)
-    with open("data/python_code/progress.txt", "w") as f:
+    # Write to a temporary file and swap it in, so an interrupted save never leaves a truncated progress file
+    with open("data/python_code/progress.txt.tmp", "w") as f:
         f.write(str(index))
+    os.replace("data/python_code/progress.txt.tmp", "data/python_code/progress.txt")
 
 def load_progress():
     os.makedirs("data/python_code", exist_ok=True)
@@ -26,12 +43,59 @@ def load_progress():
             return int(f.read().strip())
     return 0
 
+def commit_index(index):
+    """Mark a sample as written and advance the index below which every sample is on disk."""
+    global committed_index, saved_index
+    with progress_lock:
+        written_indices.add(index)
+        while committed_index in written_indices:
+            written_indices.remove(committed_index)
+            committed_index += 1
+        # Save progress and advance the progress bar in bulk rather than once per sample
+        if committed_index - saved_index >= PROGRESS_INTERVAL:
+            pbar.update(committed_index - saved_index)
+            save_progress(committed_index)
+            saved_index = committed_index
+
+def write_samples(samples):
+    while not write_failed.is_set() and (item := samples.get()) is not None:
+        index, python = item
+        try:
+            save_python_code(python)
+        except Exception as e:
+            # Stop the whole run: a dead writer would freeze committed_index and could block the producer
+            print(f"\nFailed to save sample {index} ({python.get('hexsha')}): {e}")
+            write_failed.set()
+            return
+        commit_index(index)
+
+def put_sample(samples, item):
+    """Queue a sample for the writers; returns False once a writer has failed."""
+    while not write_failed.is_set():
+        try:
+            samples.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
 def handle_termination(signum, frame):
-    global current_index
-    save_progress(current_index)
-    print(f"\nProgress saved at index {current_index}. Exiting...")
+    with progress_lock:
+        save_progress(committed_index)
+    print(f"\nProgress saved at index {committed_index}. Exiting...")
     exit(0)
 
+# Resume after the last sample that was fully written. IterableDataset.skip still streams and discards
+# the rows before start_index, so a resume re-downloads them but does not write them again.
+start_index = load_progress()
+committed_index = start_index
+saved_index = start_index
+written_indices = set()
+# Re-entrant: the signal handler runs on the main thread, which may already hold it for the final save
+progress_lock = threading.RLock()
+write_failed = threading.Event()
+os.makedirs("data/python_code/documents", exist_ok=True)
+
 # Register signal handlers
 signal.signal(signal.SIGINT, handle_termination)
 signal.signal(signal.SIGTERM, handle_termination)
@@ -44,8 +108,8 @@ signal.signal(signal.SIGTERM, handle_termination)
 # retries = Retry(total=10, backoff_factor=1, status_forcelist=[502, 503, 504])
 # session.mount('https://', HTTPAdapter(max_retries=retries))
 
-# Load the dataset in streaming mode
-ds: IterableDataset = load_dataset("bigcode/the-stack", split="train")
+# Load only the Python subset in streaming mode, so no other languages are downloaded
+ds: IterableDataset = load_dataset("bigcode/the-stack", data_dir="data/python", streaming=True, split="train")
 
 WHITE = "\033[97m"
 PURPLE = "\033[35m"
@@ -55,29 +119,42 @@ RESET = "\033[0m"
 
 debug = True
 
-# Filter the dataset to include only Python code
 term_width = shutil.get_terminal_size((80, 20)).columns - 10
 bar_format = f"{WHITE}📊 Collecting Data{{l_bar}}{GREEN}{{bar}}{WHITE}{{r_bar}}{RESET}"
 
-# Initialize the tqdm progress bar
-total_elements = ds.dataset_size
-pbar = tqdm(total=total_elements, bar_format=bar_format)
-
-# Define a wrapper function that updates the progress bar
-def filter_with_progress(x):
-    pbar.update(1)
-    return x['lang'].lower() == 'python'
+# Initialize the tqdm progress bar; the subset's row count is not known while streaming
+pbar = tqdm(bar_format=bar_format, miniters=10_000, mininterval=0.5,
+            disable=not sys.stdout.isatty())
 
-# Filter the dataset to include only Python code
-filtered_ds = ds.filter(filter_with_progress)
+# Stream samples into a bounded queue that writer threads drain to disk, overlapping download and disk I/O
+samples = queue.Queue(maxsize=PREFETCH_SIZE)
+writers = [threading.Thread(target=write_samples, args=(samples,), daemon=True) for _ in range(NUM_WRITERS)]
+for writer in writers:
+    writer.start()
 
-# Iterate over the filtered dataset
-for i, python in enumerate(filtered_ds):
-    current_index = i
+for i, python in enumerate(ds.skip(start_index), start=start_index):
     if debug:
         print(f"\n--------------------------------------------------------------------------------------------------\n")
         print(f"{GREEN}Saving this Python code: {RESET}\n")
         for k, v in python.items():
             print(f"{GREEN}{k}:{RESET} {v}")
         print(f"\n--------------------------------------------------------------------------------------------------\n")
-    save_python_code(python)
+    if not put_sample(samples, (i, python)):
+        break
+
+if not write_failed.is_set():
+    for _ in writers:
+        put_sample(samples, None)
+    for writer in writers:
+        # Writers idle in samples.get() never see a sentinel once one of them fails, so stop waiting then
+        while writer.is_alive() and not write_failed.is_set():
+            writer.join(timeout=1)
+
+with progress_lock:
+    pbar.update(committed_index - saved_index)
+    save_progress(committed_index)
+pbar.close()
+
+if write_failed.is_set():
+    print(f"Progress saved at index {committed_index}. Exiting after a write failure.")
+    sys.exit(1)
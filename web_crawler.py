@@ -1,13 +1,21 @@
 import argparse
-import hashlib
+import asyncio
+import dbm
+import functools
+import glob
+import json
+import pickle
 import shutil
+import sys
 import time
 import traceback
 import warnings
 import os
+import pathlib
 
 import pdfplumber as pdfplumber
-import requests
+import httpx
+import xxhash
 import yaml
 from bs4 import BeautifulSoup
 import re
@@ -18,14 +26,48 @@ from nipype.scripts.utils import add_args_options
 from tqdm import tqdm
 import io
 import pandas as pd
-from playwright.sync_api import sync_playwright
+from pybloom_live import ScalableBloomFilter
+from playwright.async_api import async_playwright
 
 WHITE = "\033[97m"
 PURPLE = "\033[35m"
 ORANGE = "\033[38;5;208m"
 RESET = "\033[0m"
 
-
+MAX_PARALLEL_PAGES = 4
+MAX_SURGE_RETRIES = 3
+SURGE_PROTECTION_SELECTOR = "div.surge, .challenge-error-title"
+SURGE_PROTECTION_RE = re.compile("surge protection", re.IGNORECASE)
+# Challenge pages are near-empty; only bodies shorter than this get the extra title/selector probe.
+SURGE_PROBE_MAX_BODY_CHARS = 500
+ROBOTS_CACHE_TTL = 24 * 60 * 60
+ILLEGAL_FILENAME_CHARS_TABLE = str.maketrans({c: '_' for c in '<>:"./\\|?*'})
+# Runs in the page: returns the unique absolute http(s) links whose host (or a parent domain) is allowed
+# and whose path starts with one of that host's allowed prefixes, mirroring WebCrawler.is_allowed_domain.
+EXTRACT_ALLOWED_LINKS_JS = """(allowedPaths) => {
+    const out = new Set();
+    for (const a of document.querySelectorAll('a[href]')) {
+        const href = a.href;
+        if (!/^https?:/.test(href)) continue;
+        let url;
+        try { url = new URL(href); } catch (e) { continue; }
+        const labels = url.host.toLowerCase().split('.');
+        for (let i = 0; i < labels.length; i++) {
+            const key = labels.slice(i).join('.');
+            // Own-property check, so labels like "constructor" do not resolve to Object.prototype members.
+            if (!Object.hasOwn(allowedPaths, key)) continue;
+            const prefixes = allowedPaths[key];
+            if (prefixes.some(prefix => url.pathname.startsWith(prefix))) {
+                out.add(href);
+                break;
+            }
+        }
+    }
+    return [...out];
+}"""
+
+
+@functools.lru_cache(maxsize=None)
 def load_config(config_file):
     with open(config_file, 'r') as file:
         return yaml.safe_load(file)
@@ -42,6 +84,8 @@ def main():
     parser.add_argument("--max_depth", type=int, default=2, help="Maximum depth for the web crawler.")
     parser.add_argument("--max_pages", type=int, default=10, help="Maximum number of pages to crawl.")
     parser.add_argument("--respect_robots_txt", action="store_true", help="Respect robots.txt file.")
+    parser.add_argument("--browser_endpoint", help="CDP endpoint of an already running Chromium to reuse, "
+                                                   "e.g. http://localhost:9222.")
     args = parser.parse_args()
 
     if args.debug:
@@ -50,18 +94,19 @@ def main():
         print(f"{WHITE}Topic: {args.topic}")
         print(f"Max Depth: {args.max_depth}")
         print(f"Max Pages: {args.max_pages}")
-        print(f"Respect Robots.txt: {args.respect_robots_txt}{RESET}")
+        print(f"Respect Robots.txt: {args.respect_robots_txt}")
+        print(f"Browser Endpoint: {args.browser_endpoint}{RESET}")
 
-    crawler = WebCrawler(topic=args.topic, max_depth=args.max_depth, max_pages=args.max_pages, reset=args.reset,
-                         respect_robots_txt=args.respect_robots_txt, debug=args.debug)
+    crawler = WebCrawler(config, topic=args.topic, max_depth=args.max_depth, max_pages=args.max_pages,
+                         reset=args.reset, respect_robots_txt=args.respect_robots_txt,
+                         browser_endpoint=args.browser_endpoint, debug=args.debug)
     crawler.crawl()
 
 
 class WebCrawler:
-    def __init__(self, topic, max_depth: int = 2, max_pages: int = 100, reset: bool = False,
-                 respect_robots_txt: bool = True, debug: bool = False):
+    def __init__(self, config, topic, max_depth: int = 2, max_pages: int = 100, reset: bool = False,
+                 respect_robots_txt: bool = True, browser_endpoint: str = None, debug: bool = False):
 
-        config = load_config("config.yaml")
         data_topics = config['data_topics']
         default_topic = config['default_topic']
 
@@ -77,9 +122,12 @@ class WebCrawler:
         self.data_dir = f"{topic_dir}/documents"
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
+        self._data_dir_p = pathlib.Path(self.data_dir)
         self.url_mapping_file = f"{topic_dir}/url_mapping.yml"
-        self.hashed_content_file = f"{topic_dir}/hashed_content.txt"
+        self.hashed_content_file = f"{topic_dir}/hashed_content.v2.db"
         self.context_file = f"{topic_dir}/context_data.yaml"
+        self.robots_cache_file = f"{topic_dir}/robots_cache.pkl"
+        self.browser_profile_dir = f"{topic_dir}/.pw"
 
         self.debug = debug
         if debug:
@@ -88,86 +136,315 @@ class WebCrawler:
             self.reset()
         self.start_urls = start_urls
         self.allowed_domains = allowed_domains
+        # Allowed domains may carry a path prefix ("docs.python.org/3"), so map each host to its prefixes.
+        self._allowed_paths = {}
+        for allowed in allowed_domains:
+            parsed = urlparse(f"https://{allowed}")
+            self._allowed_paths.setdefault(parsed.netloc.lower(), []).append(parsed.path)
         self.non_content_phrases = non_content_phrases
+        self._phrase_re = {domain: re.compile('|'.join(map(re.escape, phrases)))
+                           for domain, phrases in non_content_phrases.items() if phrases}
         self.max_depth = max_depth
         self.max_pages = max_pages
         self.visited_urls = set()
-        self.urls_to_visit = [(url, 0) for url in start_urls]
+        # asyncio.Queue is deque-backed, so get() is O(1); enqueued_urls keeps duplicates out of it.
+        self.urls_to_visit = asyncio.Queue()
+        self.enqueued_urls = set()
+        self._retries = {}
+        for url in start_urls:
+            self.enqueue_url(url, 0)
         self.pages_crawled = 0
+        # Pages a worker has started on; reserved before goto so parallel workers cannot overshoot max_pages.
+        self.pages_claimed = 0
+        self._page_slots = asyncio.Condition()
         self.delay = 1
         self.retry_delay = 60
-        self.content_hashes = self.load_hashes()
+        # Cleared while any worker backs off from surge protection, so every worker pauses, not just one.
+        self._crawl_resumed = asyncio.Event()
+        self._crawl_resumed.set()
+        self._surge_backoffs = 0
+        self.content_hashes, self._hash_db = self.load_hashes()
 
+        self.http = None
         self.robot_parsers = {}
+        self._robots_cache = None
+        self._robots_loading = {}
         self.respect_robots_txt = respect_robots_txt
+        self.browser_endpoint = browser_endpoint
+
+    def enqueue_url(self, url, depth):
+        if url in self.enqueued_urls:
+            return
+        self.enqueued_urls.add(url)
+        self.urls_to_visit.put_nowait((url, depth))
+
+    def requeue_url(self, url, depth):
+        """Put an already visited URL back on the queue so it is fetched again, up to MAX_SURGE_RETRIES times."""
+        self._retries[url] = self._retries.get(url, 0) + 1
+        if self._retries[url] > MAX_SURGE_RETRIES:
+            warnings.warn(f"Giving up on {url} after {MAX_SURGE_RETRIES} surge protection retries.")
+            return
+        self.visited_urls.discard(url)
+        self.urls_to_visit.put_nowait((url, depth))
+
+    def is_allowed_domain(self, url):
+        """Return True if the URL's host is an allowed domain or one of its subdomains and the path matches."""
+        parsed = urlparse(url)
+        labels = parsed.netloc.lower().split('.')
+        for i in range(len(labels)):
+            path_prefixes = self._allowed_paths.get('.'.join(labels[i:]))
+            if path_prefixes and any(parsed.path.startswith(prefix) for prefix in path_prefixes):
+                return True
+        return False
 
     def load_hashes(self):
-        if os.path.exists(self.hashed_content_file):
-            with open(self.hashed_content_file, 'r') as file:
-                return set(line.strip() for line in file)
-        return set()
+        """Open the on-disk hash index and the Bloom filter saved next to it.
+
+        The Bloom filter answers most lookups in memory; only possible hits are
+        confirmed against the dbm index, which is written incrementally. The filter
+        file is removed once loaded and rewritten by close_hashes(), so after a crash
+        it is rebuilt from the index instead of trusting a stale copy.
+        """
+        hash_db = dbm.open(self.hashed_content_file, 'c')
+        # whichdb() cannot tell yet for a fresh dumb index, so look at the backend object itself.
+        if type(hash_db).__module__ == 'dbm.dumb':
+            # dbm.dumb keeps its whole key index in memory, which costs more than the old set of hashes.
+            warnings.warn("Only dbm.dumb is available; the content hash index will be held in memory. "
+                          "Use a Python build with dbm.sqlite3 or dbm.gnu to keep it on disk.", RuntimeWarning)
+
+        bloom_file = f"{self.hashed_content_file}.bloom"
+        if os.path.exists(bloom_file):
+            with open(bloom_file, 'rb') as file:
+                bloom = ScalableBloomFilter.fromfile(file)
+            os.remove(bloom_file)
+        else:
+            bloom = ScalableBloomFilter(initial_capacity=100000, error_rate=1e-4)
+            for key in self._iter_hash_keys(hash_db):
+                bloom.add(key.decode('utf-8'))
+        return bloom, hash_db
 
-    def save_hashes(self):
-        with open(self.hashed_content_file, 'w') as file:
-            for content_hash in self.content_hashes:
-                file.write(content_hash + '\n')
+    @staticmethod
+    def _iter_hash_keys(hash_db):
+        """Yield the index keys one at a time instead of materialising keys()."""
+        if hasattr(hash_db, 'firstkey'):
+            key = hash_db.firstkey()
+            while key is not None:
+                yield key
+                key = hash_db.nextkey(key)
+            return
+        try:
+            keys = iter(hash_db)
+        except TypeError:
+            keys = iter(hash_db.keys())
+        yield from keys
+
+    def close_hashes(self):
+        with open(f"{self.hashed_content_file}.bloom", 'wb') as file:
+            self.content_hashes.tofile(file)
+        self._hash_db.close()
+
+    def is_new_content(self, content_hash):
+        """Record content_hash and return True if it has not been seen before."""
+        if content_hash in self.content_hashes and content_hash in self._hash_db:
+            return False
+        self.content_hashes.add(content_hash)
+        self._hash_db[content_hash] = b''
+        return True
 
     def crawl(self):
+        try:
+            asyncio.run(self._crawl_async())
+        finally:
+            self.close_hashes()
+            if self.respect_robots_txt:
+                self.save_robots_cache()
+            self._consolidate_url_mapping()
+            self._consolidate_context_data()
+
+    async def _crawl_async(self):
 
         term_width = shutil.get_terminal_size((80, 20)).columns - 10
         bar_format = f"{WHITE}🕷️ Crawling  {{l_bar}}{PURPLE}{{bar}}{WHITE}{{r_bar}}{RESET}"
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            with tqdm(total=self.max_pages, bar_format=bar_format, ncols=term_width, unit="page") as pbar:
-                while self.urls_to_visit and self.pages_crawled < self.max_pages:
-                    url, depth = self.urls_to_visit.pop(0)
-                    if url in self.visited_urls or depth > self.max_depth:
-                        continue
-                    if not self.is_allowed_by_robots(url) and self.respect_robots_txt:
-                        continue
-                    if self.debug:
-                        print(f"\n{WHITE}🔗  Crawling: {url}{RESET}")
-
-                    self.visited_urls.add(url)
-                    try:
-                        page = browser.new_page()
-                        page.goto(url, wait_until="networkidle", timeout=60000)
-                        self.process_page_playwright(page, url, depth)
-                        pbar.update(1)
-                        time.sleep(self.delay)
-                        page.close()
-                        self.save_hashes()
-                    except Exception as e:
-                        if self.debug:
-                            warnings.warn(f"Failed to process {url} with Playwright: {e}")
-                            traceback.print_exc()
-            browser.close()
-
-        self.save_hashes()
-
-    def get_robot_parser(self, url):
-        domain = urlparse(url).netloc
-        if domain not in self.robot_parsers:
-            robots_url = f"https://{domain}/robots.txt"
-            rp = urllib.robotparser.RobotFileParser()
-            rp.set_url(robots_url)
-            rp.read()
+        transport = httpx.AsyncHTTPTransport(http2=True, retries=3)
+        async with httpx.AsyncClient(timeout=30.0, transport=transport, follow_redirects=True) as http, \
+                async_playwright() as p:
+            self.http = http
+            if self.respect_robots_txt:
+                await self.prewarm_robot_parsers()
+            browser, context = await self.open_browser_context(p)
+            with tqdm(total=self.max_pages, bar_format=bar_format, ncols=term_width, unit="page",
+                      disable=not sys.stdout.isatty()) as pbar:
+                workers = [asyncio.create_task(self._worker(context, pbar)) for _ in range(MAX_PARALLEL_PAGES)]
+                await self.urls_to_visit.join()
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            await context.close()
+            if browser:
+                # For a browser reached over CDP this only disconnects; the browser keeps running.
+                await browser.close()
+
+    async def open_browser_context(self, p):
+        """Return the browser and the single context all pages of this crawl are opened in.
+
+        With a browser endpoint the already running Chromium is reused, skipping the cold start.
+        Otherwise a persistent context keeps cookies and cache in the topic directory across runs.
+        """
+        if self.browser_endpoint:
+            browser = await p.chromium.connect_over_cdp(self.browser_endpoint)
+            return browser, await browser.new_context()
+        context = await p.chromium.launch_persistent_context(user_data_dir=self.browser_profile_dir, headless=True)
+        return None, context
+
+    async def _worker(self, context, pbar):
+        """Pull URLs from the queue and crawl them until the crawl is cancelled."""
+        while True:
+            url, depth = await self.urls_to_visit.get()
+            try:
+                await self._crawl_url(context, pbar, url, depth)
+            except Exception as e:
+                # Keep the worker alive; if every worker died, urls_to_visit.join() would never return.
+                warnings.warn(f"Failed to crawl {url}: {e}")
+                if self.debug:
+                    traceback.print_exc()
+            finally:
+                self.urls_to_visit.task_done()
+
+    async def _claim_page_slot(self):
+        """Reserve one of the max_pages slots, waiting while in-flight pages may still free one.
+
+        Returns False once max_pages pages have actually been crawled.
+        """
+        async with self._page_slots:
+            await self._page_slots.wait_for(
+                lambda: self.pages_claimed < self.max_pages or self.pages_crawled >= self.max_pages)
+            if self.pages_crawled >= self.max_pages:
+                return False
+            self.pages_claimed += 1
+            return True
+
+    async def _release_page_slot(self, counted):
+        async with self._page_slots:
+            if not counted:
+                # Release the slot so another URL can take it.
+                self.pages_claimed -= 1
+            self._page_slots.notify_all()
+
+    async def _crawl_url(self, context, pbar, url, depth):
+        if self.pages_crawled >= self.max_pages:
+            return
+        if url in self.visited_urls or depth > self.max_depth:
+            return
+        if self.respect_robots_txt and not await self.is_allowed_by_robots(url):
+            return
+        if not await self._claim_page_slot():
+            return
+        if url in self.visited_urls:
+            await self._release_page_slot(counted=False)
+            return
+        if self.debug:
+            print(f"\n{WHITE}🔗  Crawling: {url}{RESET}")
+
+        self.visited_urls.add(url)
+        counted = False
+        try:
+            await self._crawl_resumed.wait()
+            page = await context.new_page()
+            try:
+                await page.goto(url, wait_until="domcontentloaded", timeout=15000)
+                counted = await self.process_page_playwright(page, url, depth)
+                if counted:
+                    pbar.update(1)
+                await asyncio.sleep(self.delay)
+            finally:
+                await page.close()
+        except Exception as e:
+            if self.debug:
+                warnings.warn(f"Failed to process {url} with Playwright: {e}")
+                traceback.print_exc()
+        finally:
+            await self._release_page_slot(counted)
+
+    async def prewarm_robot_parsers(self):
+        """Load robots.txt for every allowed domain in parallel, reusing cached rules younger than a day."""
+        domains = {urlparse(f"https://{allowed}").netloc for allowed in self.allowed_domains}
+        await asyncio.gather(*[self._ensure_robots(domain) for domain in domains])
+
+    def load_robots_cache(self):
+        if os.path.exists(self.robots_cache_file):
+            try:
+                with open(self.robots_cache_file, 'rb') as file:
+                    return pickle.load(file)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+        return {}
+
+    def save_robots_cache(self):
+        if self._robots_cache is None and not self.robot_parsers:
+            # No robots lookup ran (e.g. the crawl failed to start); keep the existing cache file as is.
+            return
+        # Keep fresh cached rules for domains this run did not touch, and add the ones it loaded.
+        parsers = {**(self._robots_cache or {}), **self.robot_parsers}
+        fresh_parsers = {domain: rp for domain, rp in parsers.items()
+                         if time.time() - rp.mtime() < ROBOTS_CACHE_TTL}
+        with open(self.robots_cache_file, 'wb') as file:
+            pickle.dump(fresh_parsers, file)
+
+    async def _ensure_robots(self, domain):
+        """Load the parser for domain once; concurrent callers await the same in-flight fetch."""
+        if domain in self.robot_parsers:
+            return
+        if domain not in self._robots_loading:
+            self._robots_loading[domain] = asyncio.ensure_future(self._load_robots(domain))
+        # Shield the shared fetch so a cancelled waiter does not cancel it for the others.
+        await asyncio.shield(self._robots_loading[domain])
+
+    async def _load_robots(self, domain):
+        if self._robots_cache is None:
+            self._robots_cache = self.load_robots_cache()
+        rp = self._robots_cache.get(domain)
+        if rp is not None and time.time() - rp.mtime() < ROBOTS_CACHE_TTL:
             self.robot_parsers[domain] = rp
+            return
+
+        robots_url = f"https://{domain}/robots.txt"
+        rp = urllib.robotparser.RobotFileParser(robots_url)
+        try:
+            response = await self.http.get(robots_url)
+        except httpx.HTTPError as e:
+            if self.debug:
+                warnings.warn(f"Failed to retrieve {robots_url}: {e}", UserWarning)
+        else:
+            # Mirror RobotFileParser.read(): 401/403 block the domain, other client errors allow it.
+            if response.status_code in (401, 403):
+                rp.disallow_all = True
+                rp.modified()
+            elif 400 <= response.status_code < 500:
+                rp.allow_all = True
+                rp.modified()
+            elif response.status_code == 200:
+                rp.parse(response.text.splitlines())
+        # A parser that was never read disallows everything and is not cached.
+        self.robot_parsers[domain] = rp
+
+    async def get_robot_parser(self, url):
+        domain = urlparse(url).netloc
+        await self._ensure_robots(domain)
         return self.robot_parsers[domain]
 
-    def is_allowed_by_robots(self, url):
-        rp = self.get_robot_parser(url)
+    async def is_allowed_by_robots(self, url):
+        rp = await self.get_robot_parser(url)
         return rp.can_fetch("*", url)
 
-    def fetch_page_bs4(self, url):
-        """Fetch a page using requests."""
+    async def fetch_page_bs4(self, url):
+        """Fetch a page using the shared httpx client."""
         try:
-            response = requests.get(url)
+            response = await self.http.get(url)
             if response.status_code == 200:
                 return response
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             if self.debug:
-                warnings.warn(f"Failed to retrieve {url} via requests: {e}", UserWarning)
+                warnings.warn(f"Failed to retrieve {url} via httpx: {e}", UserWarning)
         return None
 
     def process_page(self, response, url, depth):
@@ -175,72 +452,81 @@ class WebCrawler:
         if not self.process_response(response, url, depth):
             return
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(response.text, 'lxml')
         self.parse_links(soup, url, depth)
         self.pages_crawled += 1
 
-    def process_page_playwright(self, page, url, depth):
+    async def process_page_playwright(self, page, url, depth):
         """Process a page fetched and rendered by Playwright.
 
         This method uses Playwright’s own DOM querying to check for surge protection,
-        compute content hashes, scrape content, and extract links.
+        compute content hashes, scrape content, and extract links. Returns False if the
+        page hit surge protection and was requeued instead of counted.
         """
-        # Use the inner text of the body to check for surge protection.
-        page_text = page.inner_text("body")
-        if "surge protection" in page_text.lower():
+        # The body text is needed for hashing anyway, so search it without a lowercased copy. The title and
+        # known challenge containers are only probed for near-empty bodies, where the text may not say it.
+        page_text = await page.inner_text("body")
+        surge_protected = bool(SURGE_PROTECTION_RE.search(page_text))
+        if not surge_protected and len(page_text.strip()) < SURGE_PROBE_MAX_BODY_CHARS:
+            title, challenge = await asyncio.gather(page.title(), page.query_selector(SURGE_PROTECTION_SELECTOR))
+            surge_protected = bool(SURGE_PROTECTION_RE.search(title)) or challenge is not None
+        if surge_protected:
             print(f"{WHITE}❗ Surge protection triggered. Waiting for {self.retry_delay} seconds.{RESET}")
-            time.sleep(self.retry_delay)
-            self.urls_to_visit.append((url, depth))
-            return
+            # Count overlapping back-offs so the first one to finish does not resume the crawl early.
+            self._surge_backoffs += 1
+            self._crawl_resumed.clear()
+            try:
+                await asyncio.sleep(self.retry_delay)
+            finally:
+                self._surge_backoffs -= 1
+                if not self._surge_backoffs:
+                    self._crawl_resumed.set()
+            self.requeue_url(url, depth)
+            return False
 
         # Compute content hash based on page text.
-        content_hash = hashlib.md5(page_text.encode('utf-8')).hexdigest()
-        if content_hash not in self.content_hashes:
-            self.content_hashes.add(content_hash)
+        content_hash = xxhash.xxh3_128(page_text.encode('utf-8', 'ignore')).hexdigest()
+        if self.is_new_content(content_hash):
             if url.lower().endswith('.pdf'):
-                # For PDFs, fallback to requests-based processing.
-                response = self.fetch_page_bs4(url)
+                # For PDFs, fallback to httpx-based processing.
+                response = await self.fetch_page_bs4(url)
                 if response:
                     self.process_pdf(url, response.content)
             else:
-                self.scrape_text_from_playwright(page, url)
+                await self.scrape_text_from_playwright(page, url, page_text)
 
-        # Extract links using Playwright's DOM evaluation.
-        links = page.eval_on_selector_all("a", "elements => elements.map(el => el.href)")
+        # Filter links in the page so only allowed, absolute URLs are sent back over CDP.
+        links = await page.evaluate(EXTRACT_ALLOWED_LINKS_JS, self._allowed_paths)
         for link in links:
-            if not re.match(r'^https?://', link):
-                link = urljoin(url, link)
-            if not any(allowed in link for allowed in self.allowed_domains):
-                continue
-            if link not in self.visited_urls:
-                self.urls_to_visit.append((link, depth + 1))
+            self.enqueue_url(link, depth + 1)
         self.pages_crawled += 1
+        return True
 
-    def scrape_text_from_playwright(self, page, url):
+    async def scrape_text_from_playwright(self, page, url, body_text=None):
         """
         Scrape the page content using Playwright's DOM querying.
         This method mirrors the logic from the bs4-based scraping,
-        but it directly queries the page.
+        but it directly queries the page. body_text is the already fetched
+        body text, reused when there is no article body element.
         """
         domain = urlparse(url).netloc
-        try:
-            filter_lines = self.non_content_phrases[domain]
-        except KeyError:
-            filter_lines = []
+        phrase_re = self._phrase_re.get(domain)
 
         # Try to locate the main article body.
-        article_elem = page.query_selector("div[itemprop='articleBody']")
+        article_elem = await page.query_selector("div[itemprop='articleBody']")
         if article_elem:
-            text = article_elem.inner_text()
+            text = await article_elem.inner_text()
+        elif body_text is not None:
+            text = body_text
         else:
-            text = page.inner_text("body")
+            text = await page.inner_text("body")
         # Filter the text by splitting into lines and removing unwanted content.
         lines = text.splitlines()
         if self.debug:
             print("Number of lines:", len(lines))
-            print("Lines to filter:", len(filter_lines))
+            print("Lines to filter:", len(self.non_content_phrases.get(domain) or []))
         filtered_lines = [line for line in lines if len(line.split()) > 2 and
-                          not any(phrase in line for phrase in filter_lines)]
+                          not (phrase_re and phrase_re.search(line))]
         if self.debug:
             print("Number of filtered lines:", len(filtered_lines))
         filtered_text = "\n".join(filtered_lines)
@@ -251,12 +537,11 @@ class WebCrawler:
         if filtered_text.strip():
             filename = self.url_to_filename(url, "txt")
             self.update_url_mapping(filename, url)
-            file_path = os.path.join(self.data_dir, filename)
-            with open(file_path, 'w', encoding='utf-8') as file:
+            with (self._data_dir_p / filename).open('w', encoding='utf-8') as file:
                 file.write(filtered_text)
 
     def create_fake_response(self, content):
-        """Create a fake response object to mimic requests.Response."""
+        """Create a fake response object to mimic httpx.Response."""
         class FakeResponse:
             pass
 
@@ -267,14 +552,13 @@ class WebCrawler:
         return fake
 
     def process_response(self, response, url, depth):
-        if "surge protection" in response.text.lower():
+        if SURGE_PROTECTION_RE.search(response.text):
             print(f"{WHITE}❗ Surge protection triggered. Waiting for {self.retry_delay} seconds.{RESET}")
             time.sleep(self.retry_delay)
-            self.urls_to_visit.append((url, depth))  # Re-add URL to retry later
+            self.requeue_url(url, depth)  # Re-add URL to retry later
             return False
-        content_hash = hashlib.md5(str(response.content).encode('utf-8')).hexdigest()
-        if content_hash not in self.content_hashes:
-            self.content_hashes.add(content_hash)
+        content_hash = xxhash.xxh3_128(response.content).hexdigest()
+        if self.is_new_content(content_hash):
             if url.lower().endswith('.pdf'):
                 self.process_pdf(url, response.content)
             else:
@@ -285,17 +569,18 @@ class WebCrawler:
 
     def scrape_text_from_pdf(self, url, pdf_content):
         filename = self.url_to_filename(url, "txt")
-        with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-            text = str()
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text() + "\n"
-                text = f"{text}\n{page_text}"
-            with open(f"{self.data_dir}/{filename}", 'w', encoding='utf-8') as file:
-                file.write(page_text)
-            self.update_url_mapping(filename, url)
+        with pdfplumber.open(io.BytesIO(pdf_content)) as pdf, \
+                (self._data_dir_p / filename).open('w', encoding='utf-8') as file:
+            # Write each page as it is extracted instead of concatenating the whole document first.
+            for page in pdf.pages:
+                page_text = page.extract_text()
+                if page_text:
+                    file.write(page_text)
+                    file.write("\n")
+        self.update_url_mapping(filename, url)
 
     def process_html(self, url, response):
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(response.text, 'lxml')
         self.scrape_text_from_html(url, soup)
 
     def scrape_text_from_html(self, url, soup):
@@ -305,7 +590,7 @@ class WebCrawler:
         # Check if the article body exists
         if not main_content:
             # Remove menus and other non-content elements
-            for element in soup(['footer', 'nav', 'aside', 'form', 'noscript']):
+            for element in soup.select('footer, nav, aside, form, noscript'):
                 element.decompose()
 
             # Extract the main content (attempt to filter out non-content sections)
@@ -315,9 +600,10 @@ class WebCrawler:
         text = " ".join([content.get_text(separator=' ') for content in main_content])
 
         # Filter out lines that do not contain actual content and non-content phrases
+        phrase_re = self._phrase_re.get(urlparse(url).netloc)
         content_lines = [line for line in text.splitlines()
                          if len(line.split()) > 2 and
-                         not any(phrase in line for phrase in self.non_content_phrases)]
+                         not (phrase_re and phrase_re.search(line))]
 
         # Join the filtered lines
         filtered_text = '\n'.join(content_lines)
@@ -326,63 +612,77 @@ class WebCrawler:
         if filtered_text.strip():
             filename = self.url_to_filename(url, "txt")
             self.update_url_mapping(filename, url)
-            html_file_path = f"{self.data_dir}/{filename}"
-
-            os.makedirs(self.data_dir, exist_ok=True)
-            with open(html_file_path, 'w', encoding='utf-8') as file:
+            with (self._data_dir_p / filename).open('w', encoding='utf-8') as file:
                 file.write(filtered_text)
 
     @staticmethod
     def url_to_filename(url: str, file_format="", no_type=False, name_extension=""):
         # Replace illegal characters with underscores
-        filename = re.sub(r'[<>:"./\\|?*]', '_', url[8:])
+        filename = url[8:].translate(ILLEGAL_FILENAME_CHARS_TABLE)
         if no_type:
             return f"{filename}{name_extension}"
         return f"{filename}{name_extension}.{file_format}"
 
     def update_url_mapping(self, filename: str, url: str):
-        if not os.path.exists(self.url_mapping_file):
-            url_mapping = {'documents': {}}
+        # Append to a JSONL sidecar; it is folded into the YAML file once the crawl ends.
+        with open(f"{self.url_mapping_file}.jsonl", 'a', encoding='utf-8') as file:
+            file.write(json.dumps({filename: url}) + '\n')
+
+    def _consolidate_url_mapping(self):
+        self._consolidate_sidecar(self.url_mapping_file, 'documents')
+
+    def _consolidate_sidecar(self, yaml_file, root_key):
+        """Merge the entries of the JSONL sidecar into yaml_file under root_key and remove the sidecar."""
+        sidecar_file = f"{yaml_file}.jsonl"
+        if not os.path.exists(sidecar_file):
+            return
+
+        if not os.path.exists(yaml_file):
+            data = {root_key: {}}
         else:
-            with open(self.url_mapping_file, 'r') as file:
-                url_mapping = yaml.safe_load(file) or {'documents': {}}
+            with open(yaml_file, 'r') as file:
+                data = yaml.safe_load(file) or {root_key: {}}
 
-        url_mapping['documents'][filename] = url
+        with open(sidecar_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    data[root_key].update(json.loads(line))
 
-        with open(self.url_mapping_file, 'w') as file:
-            yaml.safe_dump(url_mapping, file)
+        with open(yaml_file, 'w') as file:
+            yaml.safe_dump(data, file)
+        os.remove(sidecar_file)
 
     def parse_links(self, soup, base_url, depth):
         links = []
         for link in soup.find_all('a', href=True):
             href = link['href']
-            if not re.match(r'^https?://', href):
+            if not href.startswith(('http://', 'https://')):
                 href = urljoin(base_url, href)
-            if not any(allowed_domain in href for allowed_domain in self.allowed_domains):
-               continue
-            if href not in self.visited_urls:
-                self.urls_to_visit.append((href, depth + 1))
+            if not self.is_allowed_domain(href):
+                continue
+            self.enqueue_url(href, depth + 1)
         return links
 
     def update_context_data(self, filename, url, context):
-        if not os.path.exists(self.context_file):
-            context_data = {'files': {}}
-        else:
-            with open(self.context_file, 'r') as file:
-                context_data = yaml.safe_load(file) or {'files': {}}
-
-        context_data['files'][filename] = {'url': url, 'context': context}
+        with open(f"{self.context_file}.jsonl", 'a', encoding='utf-8') as file:
+            file.write(json.dumps({filename: {'url': url, 'context': context}}) + '\n')
 
-        with open(self.context_file, 'w') as file:
-            yaml.safe_dump(context_data, file)
+    def _consolidate_context_data(self):
+        self._consolidate_sidecar(self.context_file, 'files')
 
     def reset(self):
         print(f"{WHITE}✨  Clearing Datastorage{RESET}")
-        if os.path.isfile(self.url_mapping_file):
-            os.remove(self.url_mapping_file)
+        for stale_file in (self.url_mapping_file, f"{self.url_mapping_file}.jsonl", self.robots_cache_file):
+            if os.path.isfile(stale_file):
+                os.remove(stale_file)
+
+        # dbm backends may store the index across several suffixed files.
+        for hash_file in glob.glob(f"{glob.escape(self.hashed_content_file)}*"):
+            os.remove(hash_file)
 
-        if os.path.isfile(self.hashed_content_file):
-            os.remove(self.hashed_content_file)
+        # The persistent browser profile holds cookies and HTTP cache from earlier crawls.
+        if os.path.isdir(self.browser_profile_dir):
+            shutil.rmtree(self.browser_profile_dir)
 
         if os.path.isdir(self.data_dir):
             shutil.rmtree(self.data_dir)